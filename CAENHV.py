@@ -6,9 +6,16 @@ Check CAEN HV Wrapper Library for more info
 Tao Huang, 2025 March
 """
 
-from pyparsing import wraps
+from functools import cache, wraps
 from caen_libs import caenhvwrapper as hvwrapper
 
+# name -> enum lookup tables, built once at import
+_SYS_TYPES = {e.name: e for e in hvwrapper.SystemType}
+_LINK_TYPES = {e.name: e for e in hvwrapper.LinkType}
+# write-only modes, compared on every param read/write guard
+_WRONLY = hvwrapper.ParamMode.WRONLY
+_SYSPROP_WRONLY = hvwrapper.SysPropMode.WRONLY
+
 from argparse import ArgumentDefaultsHelpFormatter, ArgumentParser
 
 # Parse arguments
@@ -18,123 +25,623 @@ parser = ArgumentParser(
 )
 
 import time
+import os
+import pickle
+import hashlib
+import threading
+import queue
+from concurrent.futures import ThreadPoolExecutor
 try:
     from tabulate import tabulate
     has_tabulate = True
 except ModuleNotFoundError:
     print ("Package `tabulate` not found.")
     has_tabulate = False
+try:
+    import numpy as np
+    has_numpy = True
+except ModuleNotFoundError:
+    print ("Package `numpy` not found.")
+    has_numpy = False
+try:
+    from platformdirs import user_cache_dir
+    METADATA_CACHE_DIR = user_cache_dir('caenhv')
+except ModuleNotFoundError:
+    METADATA_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'caenhv')
 
 from math import ceil
+from contextlib import contextmanager
+
+# Channel status bits (CAEN UM2463): bit 6 = external trip, bit 9 = internal trip (overcurrent held longer than Trip)
+STATUS_TRIP_MASK = (1 << 6) | (1 << 9)
+
+# Order in which channel settings are written: the SVMax limit goes before the setpoints it bounds
+CONFIG_PARAM_ORDER = ('SVMax', 'V0Set', 'I0Set', 'V1Set', 'I1Set', 'POn', 'PDwn', 'RUp', 'RDWn', 'Trip', 'ImRange', 'ZCDetect', 'ZCAdjust')
+
+@cache
+def _sw_release():
+    """
+    Version of the loaded CAEN HV Wrapper library; it cannot change within a process
+    """
+    return hvwrapper.lib.sw_release()
 
 def auto_connect_disconnect(func):
     @wraps(func)
     def wrapper(self, *args, **kwargs):
-        # Ensure the device is connected (or already connected) before calling the wrapped function.
-        no_device =  self.device is None
-        if no_device:
-            try:
-                self.reconfig()
-            except RuntimeError as e:
-                if self.device is None:
-                    raise RuntimeError("Failed to connect to the CAEN HV device. Please check the connection.") from e
-
-        # Call the wrapped function and attempt to disconnect afterwards.
-        try:
-            result = func(self, *args, **kwargs)
-        finally:
-            if no_device: ## only disconnect if we had to connect here
+        ## the lock keeps the heartbeat thread off the device while a call is using it
+        with self._lock:
+            # Ensure the device is connected (or already connected) before calling the wrapped function.
+            no_device =  self.device is None
+            if no_device:
                 try:
-                    self.disconnect()
-                except Exception:
-                    if getattr(self, 'verbose', False):
-                        print("Warning: disconnect raised an exception")
-        return result
+                    self.reconfig()
+                except RuntimeError as e:
+                    if self.device is None:
+                        raise RuntimeError("Failed to connect to the CAEN HV device. Please check the connection.") from e
+
+            # Call the wrapped function and attempt to disconnect afterwards.
+            try:
+                result = func(self, *args, **kwargs)
+            finally:
+                if no_device and self._session_depth == 0: ## only disconnect if we had to connect here and no session holds the connection
+                    try:
+                        self.disconnect()
+                    except Exception:
+                        if getattr(self, 'verbose', False):
+                            print("Warning: disconnect raised an exception")
+            return result
     return wrapper
 
 
+def _same_value(current, desired, tol=1e-3):
+    """
+    Whether a value read back from the crate already matches the desired setting;
+    numbers (including bools) are compared with a tolerance since the crate returns floats
+    """
+    if isinstance(current, (int, float)) and isinstance(desired, (int, float)):
+        return abs(current - desired) <= tol
+    return current == desired
+
+def _format_table(table, headers, title):
+    if has_tabulate:
+        return tabulate(table, headers=headers, tablefmt="simple_outline")
+    return f"{title}: {'/'.join(map(str, headers))} {table}"
+
+def format_crate_snapshot(snapshot):
+    """
+    Text of a CAENHV.crate_snapshot(): board info line and channel table of each slot
+    """
+    lines = []
+    for slot, info in snapshot.items():
+        parts = [f"Board info in slot {slot}:"]
+        for param_name, param_value in info['board'].items():
+            parts.append(f" {param_name}:{param_value};")
+        lines.append("".join(parts))
+        lines.append(_format_table(info['table'], info['headers'], "Channel information"))
+    return "\n".join(lines)
+
+def format_diff(old, new):
+    """
+    Text of what changed between two crate snapshots taken with the same selection:
+    changed cells show 'old -> new', unchanged cells are blank and unchanged channels are left out
+    """
+    lines = []
+    for slot, info in new.items():
+        old_info = old.get(slot)
+        if old_info is None:
+            lines.append(f"Slot {slot} is not in the old snapshot")
+            continue
+        parts = [f"Changes in slot {slot}:"]
+        for param_name, param_value in info['board'].items():
+            old_value = old_info['board'].get(param_name)
+            if old_value != param_value:
+                parts.append(f" {param_name}:{old_value} -> {param_value};")
+        old_rows = {row[0]: row for row in old_info['table']}
+        table = []
+        for row in info['table']:
+            old_row = old_rows.get(row[0], [row[0]] + [None] * (len(row) - 1))
+            cells = ['' if old_value == value else f"{old_value} -> {value}" for old_value, value in zip(old_row[1:], row[1:])]
+            if any(cells):
+                table.append([row[0], *cells])
+        if len(parts) == 1 and len(table) == 0:
+            continue
+        lines.append("".join(parts))
+        if len(table) > 0:
+            lines.append(_format_table(table, info['headers'], "Channel changes"))
+    if len(lines) == 0:
+        return "No changes"
+    return "\n".join(lines)
+
 
 class CAENHV():
     
-    def __init__(self, systemtype='SY4527', linktype='TCPIP', param='192.168.0.1', usrname='admin', password='rice2024', verbose=False):
+    def __init__(self, systemtype='SY4527', linktype='TCPIP', param='192.168.0.1', usrname='admin', password='rice2024', verbose=False, use_cache=True, heartbeat=15):
+        """
+        use_cache: keep crate param metadata in an on-disk cache (METADATA_CACHE_DIR) so later runs
+        against the same crate skip the metadata queries
+        heartbeat: seconds between keep-alive reads while connected (started on every connect, stopped by
+        disconnect()), so the CFE server does not drop an idle connection; 0 disables it
+        """
         self.systemtype = systemtype
         self.linktype = linktype 
         self.ip = param
         self.usrname = usrname
         self.password = password
         self.verbose = verbose
+        self.use_cache = use_cache
         self.device = None
         self.slots = []
         self.sys_props = []
         # Timestamp until which the device is considered "dispatched" (temporarily closed)
         # If now < _dispatched_until, reconnect attempts should be refused.
         self._dispatched_until = 0.0
+        # Number of nested session() blocks; while > 0 the connection is kept open between calls
+        self._session_depth = 0
+        # (slot, ch, param) subscribed for events on the current connection
+        self._ch_subscriptions = set()
+        # Serializes device access between callers and the heartbeat thread
+        self._lock = threading.RLock()
+        self._heartbeat_interval = heartbeat
+        self._hb_stop = threading.Event()   # stop event of the current heartbeat thread
+        self._hb_thread = None
+        # Idle worker connections of _map_on_workers(), kept open until disconnect()
+        self._worker_pool = queue.SimpleQueue()
+        # Param metadata (names/properties) is static for a given crate, cache it instead of re-querying
+        self._bd_param_info = {}   # slot -> list of board param names
+        self._bd_param_prop = {}   # (slot, param) -> ParamProp
+        self._ch_param_info = {}   # (slot, ch) -> list of channel param names
+        self._ch_param_prop = {}   # (slot, ch, param) -> ParamProp
+        self._ch_param_info_set = {}   # (slot, ch) -> frozenset of channel param names, for membership checks
+        self._sys_prop_info = {}   # sys prop name -> prop info (type/mode)
+        self._metadata_dirty = False   # metadata added since the on-disk cache was last written
         
-        allSystemType = [i.name for i in hvwrapper.SystemType]
-        allLinkType = [i.name for i in hvwrapper.LinkType]
-        if systemtype not in allSystemType:
-            raise KeyError(f"systemtype of CAENHV is not correct: {systemtype}; only available choices: ", allSystemType)
+        try:
+            self._systype_enum = _SYS_TYPES[systemtype]
+        except KeyError:
+            raise KeyError(f"systemtype of CAENHV is not correct: {systemtype}; only available choices: ", list(_SYS_TYPES)) from None
 
-        if linktype not in allLinkType:
-            raise KeyError(f"linktype of CAENHV is not correct: {linktype}; only available choices: ", allLinkType)
         try:
-            self.device = hvwrapper.Device.open(hvwrapper.SystemType[self.systemtype], hvwrapper.LinkType[self.linktype], self.ip, usrname, password)
+            self._linktype_enum = _LINK_TYPES[linktype]
+        except KeyError:
+            raise KeyError(f"linktype of CAENHV is not correct: {linktype}; only available choices: ", list(_LINK_TYPES)) from None
+        try:
+            self.device = hvwrapper.Device.open(self._systype_enum, self._linktype_enum, self.ip, usrname, password)
             self.slots = self.device.get_crate_map() # initialize internal stuff
-            self.sys_props = self.device.get_sys_prop_list()
+            self._load_sys_props()
             if self.verbose:
                 print("Successfully initialized the CAEN HV Controller: ", self.device)
         except hvwrapper.Error as e:
             # color helper removed — print plain message
             print("Failed to connect to the CAEN HV device. Please check the connection.")
             self.device = None
+        if self.device is not None:
+            self._start_heartbeat()
         
     
-    def reconfig(self):
+    def _start_heartbeat(self):
+        if self._heartbeat_interval <= 0:
+            return
+        if self._hb_thread is not None and self._hb_thread.is_alive() and not self._hb_stop.is_set():
+            return ## already running for this connection
+        ## any readable sys prop will do, stop looking at the first one
+        try:
+            prop_name = next((name for name in self.sys_props if self._get_sys_prop_info(name).mode is not _SYSPROP_WRONLY), None)
+        except hvwrapper.Error as e:
+            if self.verbose:
+                print(f"Heartbeat not started, failed to read sys prop info: {e}")
+            return
+        if prop_name is None:
+            return
+        ## a fresh event per thread, so a stopped thread that has not exited yet cannot be revived
+        self._hb_stop = threading.Event()
+        self._hb_thread = threading.Thread(target=self._heartbeat, args=(self._heartbeat_interval, prop_name, self._hb_stop), daemon=True)
+        self._hb_thread.start()
+
+    def _heartbeat(self, interval, prop_name, stop):
+        """
+        Read a system prop every interval seconds until stop is set by disconnect(), reconnecting if the read fails
+        """
+        lost = False ## connection dropped and not re-opened yet
+        while not stop.wait(interval):
+            with self._lock:
+                if stop.is_set():
+                    continue
+                if self.device is not None:
+                    lost = False ## re-opened meanwhile, e.g. by a decorated call
+                    try:
+                        self.device.get_sys_prop(prop_name)
+                        continue
+                    except hvwrapper.Error as e:
+                        if self.verbose:
+                            print(f"Heartbeat failed ({e}); reconnecting")
+                        ## release the dead handles before opening a new one
+                        try:
+                            self.device.close()
+                        except hvwrapper.Error:
+                            pass
+                        self.device = None
+                        self._close_worker_devices()
+                        self._ch_subscriptions.clear()
+                        lost = True
+                if not lost:
+                    continue
+                try:
+                    self.reconfig()
+                    lost = False
+                except (hvwrapper.Error, RuntimeError) as e:
+                    if self.verbose:
+                        print(f"Reconnect from heartbeat failed: {e}")
+
+    def _check_dispatched(self):
         # Prevent re-opening while the device is intentionally dispatched
         if getattr(self, '_dispatched_until', 0) > time.time():
             raise RuntimeError(f"Device is dispatched until {self._dispatched_until}; cannot re-open now")
 
-        self.device = hvwrapper.Device.open(hvwrapper.SystemType[self.systemtype], hvwrapper.LinkType[self.linktype], self.ip, self.usrname, self.password)
-        self.slots = self.device.get_crate_map()
+    def reconfig(self):
+        with self._lock:
+            self._check_dispatched()
+            self.device = self._open_device()
+            slots = self.device.get_crate_map()
+            if len(self.slots) > 0 and slots != self.slots: ## boards changed, cached metadata is no longer valid
+                self.invalidate_metadata_cache()
+            self.slots = slots
+            if len(self.sys_props) == 0: ## not filled if __init__ failed to connect
+                self._load_sys_props()
+            self._start_heartbeat()
+
+    def _load_sys_props(self):
+        ## from the on-disk metadata cache when the crate map matches, otherwise from the crate
+        if not (self.use_cache and self._load_metadata_cache()):
+            self.sys_props = self.device.get_sys_prop_list()
+            self._metadata_dirty = True
         
-    def disconnect(self):
+    @contextmanager
+    def session(self):
         """
-        Close the underlying device.
+        Keep the connection open across several calls instead of connecting/disconnecting around each one:
+            with hv.session():
+                for ch in chs:
+                    hv.read_channel_param(slot, ch, 'VMon')
+        The connection is closed when the outermost session that opened it exits.
+        """
+        with self._lock:
+            opened = self.device is None
+            if opened:
+                self.reconfig()
+            self._session_depth += 1
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._session_depth -= 1
+                if opened and self._session_depth == 0:
+                    self.disconnect()
+
+    def invalidate_metadata_cache(self):
+        """
+        Drop the cached board/channel param metadata, e.g. after boards were swapped in the crate.
         """
+        self._bd_param_info.clear()
+        self._bd_param_prop.clear()
+        self._ch_param_info.clear()
+        self._ch_param_prop.clear()
+        self._ch_param_info_set.clear()
+        self._sys_prop_info.clear()
+        self._metadata_dirty = True
 
+    def _metadata_cache_path(self):
+        key = hashlib.sha1(f"{self.systemtype}|{self.linktype}|{self.ip}|{_sw_release()}".encode()).hexdigest()
+        return os.path.join(METADATA_CACHE_DIR, f"{key}.pkl")
 
+    def _load_metadata_cache(self):
+        """
+        Fill the metadata caches from disk; return False if there is no usable cache for the current crate map.
+        """
+        path = self._metadata_cache_path()
         try:
-            # attempt close; underlying wrapper may raise if the connection is already down
-            self.device.close()
+            with open(path, 'rb') as f:
+                cached = pickle.load(f)
+        except FileNotFoundError:
+            return False
+        except Exception as e:
+            if self.verbose:
+                print(f"Ignoring unreadable metadata cache {path}: {e}")
+            return False
+        ## crate map includes board models, serial numbers and firmware, so a mismatch means stale metadata
+        if cached.get('crate_map') != self.slots:
             if self.verbose:
-                print("Disconnected CAEN HV system")
+                print(f"Crate map changed, ignoring metadata cache {path}")
+            return False
+        self.sys_props = cached['sys_props']
+        self._sys_prop_info.update(cached['sys_prop_info'])
+        self._bd_param_info.update(cached['bd_param_info'])
+        self._bd_param_prop.update(cached['bd_param_prop'])
+        self._ch_param_info.update(cached['ch_param_info'])
+        self._ch_param_prop.update(cached['ch_param_prop'])
+        self._ch_param_info_set.update((key, frozenset(info)) for key, info in self._ch_param_info.items())
+        if self.verbose:
+            print(f"Loaded metadata cache {path}")
+        return True
+
+    def save_metadata_cache(self):
+        """
+        Write the metadata caches to disk if anything was added since the last write; called on disconnect.
+        """
+        if not self.use_cache or not self._metadata_dirty or len(self.slots) == 0:
+            return
+        path = self._metadata_cache_path()
+        cached = {
+            'crate_map': self.slots,
+            'sys_props': self.sys_props,
+            'sys_prop_info': self._sys_prop_info,
+            'bd_param_info': self._bd_param_info,
+            'bd_param_prop': self._bd_param_prop,
+            'ch_param_info': self._ch_param_info,
+            'ch_param_prop': self._ch_param_prop,
+        }
+        try:
+            os.makedirs(METADATA_CACHE_DIR, exist_ok=True)
+            tmp_path = path + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(cached, f)
+            os.replace(tmp_path, path)
+            self._metadata_dirty = False
         except Exception as e:
-            msg = str(e)
-            if isinstance(e, hvwrapper.Error):
-                # Common library states that are safe to ignore
-                if "NOTCONNECTED" in msg or "Connection failed" in msg or "CFE server down" in msg:
-                    if self.verbose:
-                        print(f"Device already disconnected or connection failed during disconnect: {msg}")
-                else:
+            if self.verbose:
+                print(f"Failed to write metadata cache {path}: {e}")
+
+    def _get_sys_prop_info(self, name):
+        try:
+            return self._sys_prop_info[name]
+        except KeyError:
+            info = self._sys_prop_info[name] = self.device.get_sys_prop_info(name)
+            self._metadata_dirty = True
+            return info
+
+    def _get_bd_param_info(self, slot):
+        try:
+            return self._bd_param_info[slot]
+        except KeyError:
+            info = self._bd_param_info[slot] = self.device.get_bd_param_info(slot)
+            self._metadata_dirty = True
+            return info
+
+    def _get_bd_param_prop(self, slot, param):
+        try:
+            return self._bd_param_prop[(slot, param)]
+        except KeyError:
+            prop = self._bd_param_prop[(slot, param)] = self.device.get_bd_param_prop(slot, param)
+            self._metadata_dirty = True
+            return prop
+
+    def _get_ch_param_info(self, slot, ch):
+        try:
+            return self._ch_param_info[(slot, ch)]
+        except KeyError:
+            info = self._ch_param_info[(slot, ch)] = self.device.get_ch_param_info(slot, ch)
+            self._ch_param_info_set[(slot, ch)] = frozenset(info)
+            self._metadata_dirty = True
+            return info
+
+    def _has_ch_param(self, slot, ch, param):
+        if (slot, ch) not in self._ch_param_info_set:
+            self._get_ch_param_info(slot, ch)
+        return param in self._ch_param_info_set[(slot, ch)]
+
+    def _get_ch_param_prop(self, slot, ch, param):
+        try:
+            return self._ch_param_prop[(slot, ch, param)]
+        except KeyError:
+            prop = self._ch_param_prop[(slot, ch, param)] = self.device.get_ch_param_prop(slot, ch, param)
+            self._metadata_dirty = True
+            return prop
+
+    def _readable_ch_params(self, slot, ch, params):
+        """
+        The params that are not write-only. Param properties are the same for every channel of a board,
+        so callers check them on one channel of the slot instead of per channel.
+        """
+        return [param_name for param_name in params
+                if self._get_ch_param_prop(slot, ch, param_name).mode is not _WRONLY]
+
+    def _read_ch_params(self, slot, ch, names):
+        """
+        Read several params of one channel, returned in the order of names.
+        The wrapper has no multi-param getter and its handle is not documented as thread-safe,
+        so the reads are issued back to back on the shared connection.
+        """
+        return [self.device.get_ch_param(slot, [ch], param_name)[0] for param_name in names]
+
+    def _open_device(self):
+        return hvwrapper.Device.open(self._systype_enum, self._linktype_enum, self.ip, self.usrname, self.password)
+
+    def _map_on_workers(self, func, items, nthreads=1):
+        """
+        Return [func(device, item) for item in items].
+        With nthreads > 1 the items are spread over worker threads. The wrapper handle is not documented
+        as thread-safe, so each worker uses its own connection from a pool kept open until disconnect();
+        the extra logins are paid once, not on every call. Pooled connections get no heartbeat, so an item
+        that fails on one is retried once on a fresh connection.
+        """
+        if nthreads <= 1 or len(items) <= 1:
+            return [func(self.device, item) for item in items]
+
+        def run(item):
+            try:
+                device = self._worker_pool.get_nowait()
+            except queue.Empty:
+                device = None
+            if device is not None:
+                try:
+                    result = func(device, item)
+                    self._worker_pool.put(device)
+                    return result
+                except hvwrapper.Error as e:
+                    ## the pooled connection may have been dropped while idle (nothing keeps it alive):
+                    ## close it and retry the item once on a fresh connection
                     if self.verbose:
-                        print(f"CAEN error during disconnect: {msg}")
-            else:
+                        print(f"Pooled worker connection failed ({e}); retrying on a new connection")
+                    self._close_worker_device(device)
+            device = self._open_worker_device()
+            try:
+                result = func(device, item)
+            except hvwrapper.Error:
+                ## the connection may be broken, do not hand it out again
+                self._close_worker_device(device)
+                raise
+            self._worker_pool.put(device)
+            return result
+
+        with ThreadPoolExecutor(max_workers=min(nthreads, len(items))) as executor:
+            return list(executor.map(run, items))
+
+    def _open_worker_device(self):
+        self._check_dispatched()
+        device = self._open_device()
+        try:
+            device.get_crate_map() # initialize internal stuff
+        except hvwrapper.Error:
+            self._close_worker_device(device)
+            raise
+        return device
+
+    def _close_worker_device(self, device):
+        try:
+            device.close()
+        except hvwrapper.Error as e:
+            if self.verbose:
+                print(f"CAEN error while closing worker connection: {e}")
+
+    def _close_worker_devices(self):
+        while True:
+            try:
+                device = self._worker_pool.get_nowait()
+            except queue.Empty:
+                return
+            self._close_worker_device(device)
+
+    def _subscribe_ch_params(self, slot, chs, params):
+        """
+        Subscribe chs of the slot to events of params; must be done before the change is commanded.
+        Return False if the system does not deliver events, callers then fall back to a fixed wait.
+        """
+        try:
+            for ch in chs:
+                missing = [param for param in params if (slot, ch, param) not in self._ch_subscriptions]
+                if len(missing) > 0:
+                    self.device.subscribe_channel_params(slot, ch, missing)
+                    self._ch_subscriptions.update((slot, ch, param) for param in missing)
+        except hvwrapper.Error as e:
+            if self.verbose:
+                print(f"Failed to subscribe {params} of slot {slot} ch {chs}: {e}")
+            return False
+        return True
+
+    def _unsubscribe_ch_params(self, keys):
+        """
+        Remove the (slot, ch, param) subscriptions in keys
+        """
+        by_channel = {}
+        for slot, ch, param in keys:
+            by_channel.setdefault((slot, ch), []).append(param)
+        for (slot, ch), params in by_channel.items():
+            try:
+                self.device.unsubscribe_channel_params(slot, ch, params)
+            except hvwrapper.Error as e:
                 if self.verbose:
-                    print(f"Error during disconnect: {msg}")
-        finally:
-            # Always clear the reference so Device.__del__ won't attempt to close again
+                    print(f"Failed to unsubscribe {params} of slot {slot} ch {ch}: {e}")
+            self._ch_subscriptions.difference_update((slot, ch, param) for param in params)
+
+    def _drain_events(self):
+        """
+        Discard the queued events, so that a stale event left from an earlier (timed-out) wait
+        cannot confirm a command that has not been issued yet.
+        """
+        self.device.get_event_data()
+
+    def _wait_for_ch_events(self, pending, param, value=None, timeout=2.0):
+        """
+        Wait until an event of param (with the given value, if not None) arrived for every (slot, ch) in pending.
+        Return True on success, False if the timeout expired first.
+        Events of other params/channels read from the queue meanwhile are discarded.
+        """
+        pending = set(pending)
+        deadline = time.monotonic() + timeout
+        while len(pending) > 0 and time.monotonic() < deadline:
+            evt_list, _ = self.device.get_event_data()
+            for evt in evt_list:
+                ## float params come back as float32, compare with a tolerance
+                if evt.item_id == param and (value is None or _same_value(evt.value, value)):
+                    pending.discard((evt.board_index, evt.channel_index))
+            if len(pending) > 0:
+                time.sleep(0.05)
+        if len(pending) > 0 and self.verbose:
+            print(f"Warning: no {param} event received in {timeout} seconds for (slot, ch) {sorted(pending)}")
+        return len(pending) == 0
+
+    def _set_ch_param_and_wait(self, slot, chs, param, value, timeout=2.0):
+        """
+        Write param of chs in the slot and wait for the crate to report the new value,
+        instead of sleeping a fixed time.
+        """
+        for ch in chs:
+            if not self._has_ch_param(slot, ch, param):
+                raise KeyError(f"param for HVCANE is not in system parameter list: {param}; list: {self.sys_props}")
+            if self._get_ch_param_prop(slot, ch, param).mode is _WRONLY:
+                raise KeyError(f"mode of this parameter {param} in Slot {slot} Ch {ch} is wrong; Failed to set value in _set_ch_param_and_wait()")
+        has_events = self._subscribe_ch_params(slot, chs, [param])
+        if has_events:
+            self._drain_events()
+        self.device.set_ch_param(slot, chs, param, value)
+        if has_events:
+            self._wait_for_ch_events([(slot, ch) for ch in chs], param, value, timeout)
+        else:
+            time.sleep(timeout)
+
+    def disconnect(self):
+        """
+        Close the underlying device.
+        """
+
+        self._hb_stop.set()
+        with self._lock:
+            self.save_metadata_cache()
+            self._close_worker_devices()
             try:
-                self.device = None
-            except Exception:
-                pass
+                # attempt close; underlying wrapper may raise if the connection is already down
+                self.device.close()
+                if self.verbose:
+                    print("Disconnected CAEN HV system")
+            except Exception as e:
+                msg = str(e)
+                if isinstance(e, hvwrapper.Error):
+                    # Common library states that are safe to ignore
+                    if "NOTCONNECTED" in msg or "Connection failed" in msg or "CFE server down" in msg:
+                        if self.verbose:
+                            print(f"Device already disconnected or connection failed during disconnect: {msg}")
+                    else:
+                        if self.verbose:
+                            print(f"CAEN error during disconnect: {msg}")
+                else:
+                    if self.verbose:
+                        print(f"Error during disconnect: {msg}")
+            finally:
+                # Always clear the reference so Device.__del__ won't attempt to close again
+                try:
+                    self.device = None
+                except Exception:
+                    pass
+                # subscriptions belong to the closed connection
+                self._ch_subscriptions.clear()
         
     @auto_connect_disconnect
     def print_system_info(self):
-        sys_params = self.device.get_sys_prop_list()
-        table = []
-        for param_name in sys_params:
-            param_value = self.device.get_sys_prop(param_name)
-            table.append([param_name, param_value])
+        if len(self.sys_props) == 0: ## not filled if the connection failed in __init__
+            self.sys_props = self.device.get_sys_prop_list()
+            self._metadata_dirty = True
+        sys_params = [param_name for param_name in self.sys_props
+                      if self._get_sys_prop_info(param_name).mode is not _SYSPROP_WRONLY]
+        table = [[param_name, self.device.get_sys_prop(param_name)] for param_name in sys_params]
         if has_tabulate:
             print(tabulate(table, headers=['param_name', 'param_value'], tablefmt="simple_outline"))
         else:
@@ -142,16 +649,16 @@ class CAENHV():
         
     @auto_connect_disconnect
     def print_board_info(self, slot, param_list=[]):
-        bd_params = self.device.get_bd_param_info(slot)
+        bd_params = self._get_bd_param_info(slot)
         table = []
         if len(param_list) == 0:
             param_list = bd_params
         #headers = ["slot", "param_name", "value", "type", "mode"]
         
         for param_name in param_list:
-            param_prop = self.device.get_bd_param_prop(slot, param_name)
+            param_prop = self._get_bd_param_prop(slot, param_name)
             #print('BD_PARAM', slot, param_name, param_prop.type.name)
-            if param_prop.mode is not hvwrapper.ParamMode.WRONLY:
+            if param_prop.mode is not _WRONLY:
                 param_value = self.device.get_bd_param([slot], param_name)[0]
                 table.append([slot, param_name, param_value, param_prop.type.name, param_prop.mode])      
         
@@ -160,73 +667,132 @@ class CAENHV():
         else:
             print("Board information: ", '/'.join(map(str, param_list)), table)
         
+    def print_crate_info(self, slotlist=[], chlist=[],  param_list=[], nthreads=1):
+        print(format_crate_snapshot(self.crate_snapshot(slotlist, chlist, param_list, nthreads)))
+
     @auto_connect_disconnect
-    def print_crate_info(self, slotlist=[], chlist=[],  param_list=[]):
+    def crate_snapshot(self, slotlist=[], chlist=[],  param_list=[], nthreads=1):
+        """
+        Read board params and the selected channel params of the selected slots:
+        {slot: {'board': {param: value}, 'headers': ['Ch', *params], 'table': [[ch, *values], ...]}}
+        Format it with format_crate_snapshot(), or compare two of them with format_diff().
+        nthreads > 1: read the slots concurrently, see _map_on_workers()
+        """
         
         #print("all slots ", list(enumerate(self.slots)))
+        ## sets for O(1) membership tests in the loops below; None means no filter
+        slotset = frozenset(slotlist) if len(slotlist) > 0 else None
+        chset = frozenset(chlist) if len(chlist) > 0 else None
+        jobs = []
         for slot, board in enumerate(self.slots):
             if board is None:
                 continue
-            if len(slotlist) > 0 and slot not in slotlist:
+            if slotset is not None and slot not in slotset:
                 continue 
             
-            bd_params = self.device.get_bd_param_info(slot)
-            #board_info_str = f"Board info in slot {slot}:"
-            board_info_str = "Baord info in slot {}: ".format(slot)
-            for param_name in bd_params:
-                param_prop = self.device.get_bd_param_prop(slot, param_name)
-                #print('BD_PARAM', slot, param_name, param_prop.type.name)
-                if param_prop.mode is not hvwrapper.ParamMode.WRONLY:
-                    param_value = self.device.get_bd_param([slot], param_name)[0]
-                    board_info_str += " {}:{};".format(param_name, param_value)
-                    #board_info_str += f" {param_name}:{param_value};"
-                    #print('VALUE', param_value)
-                    #device.subscribe_board_params(slot, [param_name])
-            table = []
-            headers = []
-            for ch in range(board.n_channel):
-                if len(chlist) > 0 and ch not in chlist:
-                    continue
-                ch_params = self.device.get_ch_param_info(slot, ch)
+            ## metadata is resolved here on the main connection (and cached), workers only read values
+            bd_params = [param_name for param_name in self._get_bd_param_info(slot)
+                         if self._get_bd_param_prop(slot, param_name).mode is not _WRONLY]
+            channels = [ch for ch in range(board.n_channel) if chset is None or ch in chset]
+            ch_params = []
+            if len(channels) > 0:
+                ch_params = self._get_ch_param_info(slot, channels[0])
                 if len(param_list) > 0:
                     ch_params = param_list
-                headers = ['Ch', *ch_params]
-                #print("all ch params ", ch_params)
-                values = [ch]
-                for param_name in ch_params:
-                    #print("param_name ", param_name, " type ", type(param_name))
-                    param_prop = self.device.get_ch_param_prop(slot, ch, param_name)
-                    #print('CH_PARAM', slot, ch, param_name, param_prop.type.name)
-                    if param_prop.mode is not hvwrapper.ParamMode.WRONLY:
-                        param_value = self.device.get_ch_param(slot, [ch], param_name)[0]
-                        values.append(param_value)
-                        #print('VALUE', param_value)
-                        #device.subscribe_channel_params(slot, ch, [param_name])
-                table.append(values)
-            print(board_info_str)
-            if has_tabulate:
-                print(tabulate(table, headers=headers, tablefmt="simple_outline"))
-            else:
-                print("Channel information: ", '/'.join(map(str, headers)), table)
-            
-        
+                ch_params = self._readable_ch_params(slot, channels[0], ch_params)
+            jobs.append((slot, bd_params, channels, ch_params))
+
+        results = self._map_on_workers(self._collect_slot, jobs, nthreads)
+        return {job[0]: result for job, result in zip(jobs, results)}
+
+    @staticmethod
+    def _collect_slot(device, job):
+        """
+        Read board and channel values of one slot for crate_snapshot
+        """
+        slot, bd_params, channels, ch_params = job
+        board = {}
+        for param_name in bd_params:
+            board[param_name] = device.get_bd_param([slot], param_name)[0]
+        headers = ['Ch', *ch_params]
+        ## one read per param for all selected channels instead of one per (ch, param)
+        cols = {}
+        for param_name in ch_params:
+            cols[param_name] = device.get_ch_param(slot, channels, param_name)
+        table = [[ch, *[cols[p][i] for p in ch_params]] for i, ch in enumerate(channels)]
+        return {'board': board, 'headers': headers, 'table': table}
+
+    @auto_connect_disconnect
+    def snapshot(self, slots=None, params=('VMon', 'IMon', 'Status', 'Pw')):
+        """
+        Read params of all channels in the given slots (default: all boards) into a columnar snapshot:
+        {'slot': int array, 'ch': int array, param: array, ...}, one entry per channel, so status
+        checks can be vectorized, e.g. tripped = (snap['Status'] & STATUS_TRIP_MASK) != 0
+        Status/Pw are stored as int32, other params as float32.
+        """
+        if not has_numpy:
+            raise RuntimeError("snapshot() requires numpy")
+        slot_ids = []
+        ch_ids = []
+        columns = {param_name: [] for param_name in params}
+        slotset = frozenset(slots) if slots is not None else None
+        for slot, board in enumerate(self.slots):
+            if board is None:
+                continue
+            if slotset is not None and slot not in slotset:
+                continue
+            channels = list(range(board.n_channel))
+            slot_ids.extend([slot] * len(channels))
+            ch_ids.extend(channels)
+            for param_name in params:
+                columns[param_name].extend(self.device.get_ch_param(slot, channels, param_name))
+        snap = {'slot': np.asarray(slot_ids, dtype=np.int32), 'ch': np.asarray(ch_ids, dtype=np.int32)}
+        for param_name, values in columns.items():
+            dtype = np.int32 if param_name in ('Status', 'Pw') else np.float32
+            snap[param_name] = np.asarray(values, dtype=dtype)
+        return snap
+
+    @auto_connect_disconnect
+    def monitor_channels(self, duration, params=('VMon', 'IMon', 'Status', 'Pw'), slots=None, handler=print):
+        """
+        Subscribe params of all channels in slots (default: all boards) and pass every event received
+        during duration seconds to handler (e.g. print, or queue.put for a consumer thread).
+        Only changes are reported by the crate, so nothing is polled while it is idle.
+        The subscriptions made here are removed again on return; without events this just sleeps for duration.
+        """
+        slotset = frozenset(slots) if slots is not None else None
+        before = set(self._ch_subscriptions)
+        try:
+            has_events = True
+            for slot, board in enumerate(self.slots):
+                if board is None:
+                    continue
+                if slotset is not None and slot not in slotset:
+                    continue
+                if not self._subscribe_ch_params(slot, range(board.n_channel), params):
+                    has_events = False
+                    break
+            if not has_events:
+                time.sleep(duration)
+                return
+            end = time.monotonic() + duration
+            while time.monotonic() < end:
+                evt_list, _ = self.device.get_event_data()
+                for evt in evt_list:
+                    handler(evt)
+                time.sleep(0.1)
+        finally:
+            ## drop the subscriptions added here so VMon/IMon events do not pile up in the queue afterwards
+            self._unsubscribe_ch_params(self._ch_subscriptions - before)
+
     @auto_connect_disconnect
     def print_channel_info(self, slot, ch, param_list=['V0Set', 'I0Set', 'VMon','IMon','Status','Pw','Temp']):
-        ch_params = self.device.get_ch_param_info(slot, ch)
+        ch_params = self._get_ch_param_info(slot, ch)
         if len(param_list) == 0: 
             param_list = ch_params
-        table = []
-        values = []
-        for param_name in param_list:
-            #print("param_name ", param_name, " type ", type(param_name))
-            param_prop = self.device.get_ch_param_prop(slot, ch, param_name)
-            #print('CH_PARAM', slot, ch, param_name, param_prop.type.name)
-            if param_prop.mode is not hvwrapper.ParamMode.WRONLY:
-                param_value = self.device.get_ch_param(slot, [ch], param_name)[0]
-                values.append(param_value)
-                #print('VALUE', param_value)
-                #device.subscribe_channel_params(slot, ch, [param_name])
-        table.append(values)
+        ## drop write-only params so the headers line up with the values
+        param_list = self._readable_ch_params(slot, ch, param_list)
+        table = [self._read_ch_params(slot, ch, param_list)]
         if has_tabulate:
             print(tabulate(table, headers=param_list, tablefmt="simple_outline"))
         else:
@@ -244,10 +810,10 @@ class CAENHV():
         Status: channel status
         """
         
-        if param not in self.device.get_ch_param_info(slot, ch):
+        if not self._has_ch_param(slot, ch, param):
             raise KeyError(f"param for HVCANE is not in system parameter list: {param}; list: {self.sys_props}")
-        param_prop = self.device.get_ch_param_prop(slot, ch, param)
-        if param_prop.mode is not hvwrapper.ParamMode.WRONLY:
+        param_prop = self._get_ch_param_prop(slot, ch, param)
+        if param_prop.mode is not _WRONLY:
             try:
                 return round(self.device.get_ch_param(slot, [ch], param)[0], 2)
             except hvwrapper.Error as e:
@@ -273,17 +839,21 @@ class CAENHV():
         Pon: Power ON options
         PDwn: Power off options
         """
-        if param not in self.device.get_ch_param_info(slot, ch):
+        if not self._has_ch_param(slot, ch, param):
             raise KeyError(f"param for HVCANE is not in system parameter list: {param}; list: {self.sys_props}")
-        param_prop = self.device.get_ch_param_prop(slot, ch, param)
-        if param_prop.mode is not hvwrapper.ParamMode.WRONLY:
+        param_prop = self._get_ch_param_prop(slot, ch, param)
+        if param_prop.mode is not _WRONLY:
             self.device.set_ch_param(slot, [ch], param, value)
         else:
             raise KeyError(f"mode of this parameter {param} in Slot {slot} Ch {ch} is wrong; Failed to set value in set_channel_param()")
     
     @auto_connect_disconnect
-    def set_channel_HV(self, slot, ch, hv_value):
-        status = self.device.get_ch_param(slot, [ch], 'Status')[0]
+    def set_channel_HV(self, slot, ch, hv_value, tolerance=0.5):
+        """
+        Set V0Set of the channel, power it on if needed and wait until VMon is within tolerance (V) of hv_value.
+        Raise RuntimeError if the channel trips while ramping.
+        """
+        status, current_hv, ramp_up, ramp_down = self._read_ch_params(slot, ch, ['Status', 'VMon', 'RUp', 'RDWn'])
         if status is None:
             print(f"Warning: could not read Status for slot {slot} ch {ch}; aborting HV set")
             return
@@ -291,9 +861,6 @@ class CAENHV():
             print(f"Error: Channel {ch} in slot {slot} is not in operating status: {status}, only updating V0Set")
             self.device.set_ch_param(slot, [ch], 'V0Set', hv_value)
             return
-        current_hv = self.device.get_ch_param(slot, [ch], 'VMon')[0]
-        ramp_up = self.device.get_ch_param(slot, [ch], 'RUp')[0]
-        ramp_down = self.device.get_ch_param(slot, [ch], 'RDWn')[0]
         if current_hv is None or ramp_up is None or ramp_down is None:
             print(f"Warning: missing channel parameters for slot {slot} ch {ch} (VMon/RUp/RDwn); aborting HV set")
             return
@@ -307,55 +874,127 @@ class CAENHV():
         self.device.set_ch_param(slot, [ch], 'V0Set', hv_value) # set the value for channel
         if status & 0x1 == 0: ## channel is off
             self.device.set_ch_param(slot, [ch], 'Pw', True) # enable the channel
-        print(f"Setting and Enabling HV of slot{slot} ch{ch} to {hv_value} V.... waiting for {nsecond} seconds...")
-        time.sleep(nsecond+2) ## wait for ~10 seconds
+        print(f"Setting and Enabling HV of slot{slot} ch{ch} to {hv_value} V.... expected ramp time {nsecond} seconds...")
+        ## poll VMon until it reaches the setpoint instead of sleeping for the whole estimated ramp time
+        deadline = time.monotonic() + nsecond * 1.5 + 5
+        interval = 0.2
+        while time.monotonic() < deadline:
+            vmon, status = self._read_ch_params(slot, ch, ['VMon', 'Status'])
+            if abs(vmon - hv_value) < tolerance:
+                break
+            if status & STATUS_TRIP_MASK:
+                raise RuntimeError(f"Channel {ch} in slot {slot} tripped while ramping to {hv_value} V: status {status}, VMon {vmon} V")
+            time.sleep(interval)
+            interval = min(interval * 1.5, 2.0)
+        else:
+            print(f"Warning: HV of slot{slot} ch{ch} did not reach {hv_value} V in time; last VMon {vmon} V")
         #param_list = ['V0Set', 'I0Set', 'VMon','IMon','Status','Pw','Temp']
         if self.verbose:
             self.print_channel_info(slot, ch)
         #print(f"Status HV of slot{slot} ch{ch}: ", self.read_channel_param(slot, ch, 'VMon'))
     
-    #@auto_connect_disconnect
+    @auto_connect_disconnect
     def power_down_channel(self, slot, ch):
-        self.set_channel_param(slot, ch, 'Pw', False)
         print(f"Power down channel {ch} in slot {slot}...")
-        time.sleep(2)
+        self._set_ch_param_and_wait(slot, [ch], 'Pw', False)
     
-    #@auto_connect_disconnect
+    @auto_connect_disconnect
     def power_on_channel(self, slot, ch):   
-        self.set_channel_param(slot, ch, 'Pw', True)
         print(f"Power on channel {ch} in slot {slot}...")
-        time.sleep(2)
+        self._set_ch_param_and_wait(slot, [ch], 'Pw', True)
 
     @auto_connect_disconnect
     def power_down_all_channels(self):
+        writes = []
+        has_events = True
         for slot, board in enumerate(self.slots):
             if board is None:
                 continue
-            for ch in range(board.n_channel):
-                status = self.device.get_ch_param(slot, [ch], 'Status')[0]
-                if status & 0x1 == 1: ## channel is on
-                    self.device.set_ch_param(slot, [ch], 'Pw', False)
-        time.sleep(2)
+            channels = list(range(board.n_channel))
+            status = self.device.get_ch_param(slot, channels, 'Status')
+            ## channels that are on (status bit 0)
+            if has_numpy:
+                on_channels = np.nonzero(np.asarray(status, dtype=np.int32) & 0x1)[0].tolist()
+            else:
+                on_channels = [ch for ch, st in zip(channels, status) if st & 0x1 == 1]
+            if len(on_channels) > 0:
+                has_events = self._subscribe_ch_params(slot, on_channels, ['Pw']) and has_events
+                writes.append((slot, on_channels))
+        if len(writes) == 0:
+            return
+        ## drain once before the first write, not between slots, so no confirmation gets dropped
+        if has_events:
+            self._drain_events()
+        pending = []
+        for slot, on_channels in writes:
+            self.device.set_ch_param(slot, on_channels, 'Pw', False)
+            pending.extend((slot, ch) for ch in on_channels)
+        if has_events:
+            self._wait_for_ch_events(pending, 'Pw', False)
+        else:
+            time.sleep(2)
     
     @auto_connect_disconnect
     def config_channel(self, slot, ch, V0Set, I0Set, V1Set=0, I1Set=1010, POn=False, PDwn=False, RampUp=20, RampDown=20, TripTime=10, SVMax=1000, ImRange=0, ZCDetect=True, ZCAdjust=False):
-       
-        self.device.set_ch_param(slot, [ch], 'V0Set', V0Set) # set the V0 value for channel
-        self.device.set_ch_param(slot, [ch], 'I0Set', I0Set) # set the current limit for channel
-        self.device.set_ch_param(slot, [ch], 'V1Set', V1Set)
-        self.device.set_ch_param(slot, [ch], 'I1Set', I1Set)
-        self.device.set_ch_param(slot, [ch], 'POn', POn) # ramp up to previous value / off when create is power-on/restarted
-        self.device.set_ch_param(slot, [ch], 'PDwn', PDwn) # ramp down/kill when tripped
-        self.device.set_ch_param(slot, [ch], 'RUp', RampUp)
-        self.device.set_ch_param(slot, [ch], 'RDWn', RampDown)
-        self.device.set_ch_param(slot, [ch], 'Trip', TripTime)
-        self.device.set_ch_param(slot, [ch], 'SVMax', SVMax)
-        self.device.set_ch_param(slot, [ch], 'ImRange', ImRange)
-        self.device.set_ch_param(slot, [ch], 'ZCDetect', ZCDetect)
-        self.device.set_ch_param(slot, [ch], 'ZCAdjust', ZCAdjust)
+        """
+        ch: channel number or list of channels in the slot; all of them get the same configuration
+        """
+        chs = list(ch) if isinstance(ch, (list, tuple, range)) else [ch]
+        ## written in CONFIG_PARAM_ORDER
+        params = {
+            'SVMax': SVMax, # software voltage limit, before V0Set/V1Set
+            'V0Set': V0Set, # set the V0 value for channel
+            'I0Set': I0Set, # set the current limit for channel
+            'V1Set': V1Set,
+            'I1Set': I1Set,
+            'POn': POn, # ramp up to previous value / off when create is power-on/restarted
+            'PDwn': PDwn, # ramp down/kill when tripped
+            'RUp': RampUp,
+            'RDWn': RampDown,
+            'Trip': TripTime,
+            'ImRange': ImRange,
+            'ZCDetect': ZCDetect,
+            'ZCAdjust': ZCAdjust,
+        }
+        ## read the current values (one read per param for all channels) and only write the channels that differ
+        writes = []
+        for param_name, value in params.items():
+            current = self.device.get_ch_param(slot, chs, param_name)
+            changed = [c for c, current_value in zip(chs, current) if not _same_value(current_value, value)]
+            if len(changed) > 0:
+                writes.append((param_name, value, changed))
+        if self.verbose:
+            nwritten = sum(len(changed) for _, _, changed in writes)
+            print(f"config_channel: writing {nwritten} and skipping {len(params) * len(chs) - nwritten} unchanged (param, channel) values")
+        if len(writes) > 0:
+            ## one write per param; the last one is confirmed by its event
+            *first_writes, (last_name, last_value, last_chs) = writes
+            for param_name, value, changed in first_writes:
+                self.device.set_ch_param(slot, changed, param_name, value)
+            self._set_ch_param_and_wait(slot, last_chs, last_name, last_value)
         print(f"Configured channel {ch} in slot {slot} with HV V0={V0Set} V and current I0={I0Set} uA")
-        time.sleep(2)
-        
+
+    @auto_connect_disconnect
+    def config_channels_bulk(self, plan):
+        """
+        plan: {(slot, ch): {param_name: value}}
+        channels in the same slot sharing the same value of a param are written with a single set_ch_param call;
+        params are written in CONFIG_PARAM_ORDER (others after them), not in the order given in the plan
+        """
+        groups = {}
+        for (slot, ch), params in plan.items():
+            for param_name, value in params.items():
+                groups.setdefault((slot, param_name, value), []).append(ch)
+        if len(groups) == 0:
+            return
+        rank = {param_name: i for i, param_name in enumerate(CONFIG_PARAM_ORDER)}
+        ordered = sorted(groups.items(), key=lambda item: rank.get(item[0][1], len(rank)))
+        ## the last write is confirmed by its event
+        *first_groups, ((last_slot, last_name, last_value), last_chs) = ordered
+        for (slot, param_name, value), chs in first_groups:
+            self.device.set_ch_param(slot, chs, param_name, value)
+        self._set_ch_param_and_wait(last_slot, last_chs, last_name, last_value)
+        print(f"Configured {len(plan)} channels with {len(groups)} writes")
     
     
 
@@ -366,34 +1005,32 @@ if __name__ == '__main__':
     #parser.add_argument('-a', '--arg', type=str, help='connection argument (depending on systemtype and linktype)', required=True)
     #parser.add_argument('-u', '--username', type=str, help='username', default='admin')
     #parser.add_argument('-p', '--password', type=str, help='password', default='rice2024')
-    #args = parser.parse_args()
+    parser.add_argument('--no-cache', action='store_true', help='do not read/write the on-disk crate metadata cache')
+    args = parser.parse_args()
     
     print('------------------------------------------------------------------------------------')
-    print(f'CAEN HV Wrapper binding loaded (lib version {hvwrapper.lib.sw_release()})')
+    print(f'CAEN HV Wrapper binding loaded (lib version {_sw_release()})')
     print('------------------------------------------------------------------------------------')
     
     
-    hvcontroller = CAENHV()
+    hvcontroller = CAENHV(use_cache=not args.no_cache)
     if hvcontroller.device is None:
         print("Failed to connect to the CAEN HV device. Please check the connection.")
         exit(1)
     else:
         print("Connected to CAEN HV device successfully.")
-        hvcontroller.print_crate_info([], [], ['V0Set', 'I0Set', 'VMon', 'IMon', 'Status', 'Pw', 'Temp'])
+        snap = hvcontroller.crate_snapshot([], [], ['V0Set', 'I0Set', 'VMon', 'IMon', 'Status', 'Pw', 'Temp'])
+        print(format_crate_snapshot(snap))
 
     #hvcontroller.disconnect()
-        # sleep to simulate long wait (may cause CFE to drop); keep as-is but catch errors
-    Tottime = 66
-    while Tottime > 0:
-        wait_time = 5
-        print(f"Waiting for {wait_time} seconds... ({Tottime} seconds remaining): device {hvcontroller.device}")
-        #hvcontroller.print_system_info()
-        time.sleep(wait_time)
-        Tottime -= wait_time
+    # long wait (may cause CFE to drop): print channel changes reported by the crate instead of polling
+    hvcontroller.monitor_channels(66)
     
     #hvcontroller.reconfig()
 
     hvcontroller.set_channel_HV(4, 0, 100)
-    hvcontroller.print_crate_info([], [], ['V0Set', 'I0Set', 'VMon','IMon','Status','Pw','Temp'])
+    ## show only what changed since the first snapshot
+    snap2 = hvcontroller.crate_snapshot([], [], ['V0Set', 'I0Set', 'VMon','IMon','Status','Pw','Temp'])
+    print(format_diff(snap, snap2))
     hvcontroller.power_down_all_channels()
     hvcontroller.disconnect()
\ No newline at end of file